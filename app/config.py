@@ -11,6 +11,7 @@ class Settings(BaseSettings):
     telegram_bot_token: str
     dev_telegram_username: str
     telegram_poll_interval: float = 5.0
+    telegram_long_poll_timeout: int = 50
 
     model_config = SettingsConfigDict(env_file=".env", extra="allow")
 
@@ -1,23 +1,30 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Iterable, List, Optional
+from typing import Iterable, Optional
 
 from uuid import uuid4
 
 
 class DecisionCoordinator:
+    """Holds the single pending human decision.
+
+    Everything except create_pending runs without awaiting, so the event loop
+    keeps reads and state resets atomic without taking the lock.
+    """
+
     def __init__(self) -> None:
         self._lock = asyncio.Lock()
         self._future: Optional[asyncio.Future[str]] = None
         self._question: Optional[str] = None
-        self._options: List[str] = []
+        self._options: tuple[str, ...] = ()
         self._request_id: Optional[str] = None
-        self._answer: Optional[str] = None
+        # Set while a decision is waiting for an answer, so callers can await it.
+        self.pending_event = asyncio.Event()
 
     @property
-    def pending_options(self) -> List[str]:
-        return self._options.copy()
+    def pending_options(self) -> tuple[str, ...]:
+        return self._options
 
     def has_pending(self) -> bool:
         return self._future is not None and not self._future.done()
@@ -31,47 +38,44 @@ class DecisionCoordinator:
             if self._future and not self._future.done():
                 raise RuntimeError("pending decision already exists")
             self._question = question
-            self._options = list(options)
+            self._options = tuple(options)
             self._future = asyncio.get_running_loop().create_future()
             self._request_id = str(uuid4())
-            self._answer = None
+            self.pending_event.set()
             return self._request_id
 
     async def request_decision(self, question: str, options: Iterable[str], timeout: float) -> str:
-        request_id = await self.create_pending(question, options)
-        async with self._lock:
-            future = self._future
+        await self.create_pending(question, options)
+        future = self._future
         if future is None:
             raise RuntimeError("decision future missing")
 
         try:
             return await asyncio.wait_for(future, timeout)
         finally:
-            async with self._lock:
-                if self._future is future:
-                    self._future = None
-                    self._question = None
-                    self._options = []
-                    self._request_id = None
-                    self._answer = None
+            # No await between the check and the reset, so the event loop
+            # cannot interleave another coroutine here.
+            if self._future is future:
+                self._reset()
 
     async def resolve(self, answer: str) -> bool:
-        async with self._lock:
-            if self._future and not self._future.done():
-                self._answer = answer
-                self._future.set_result(answer)
-                return True
+        if self._future and not self._future.done():
+            self._future.set_result(answer)
+            self.pending_event.clear()
+            return True
         return False
 
     async def cancel_pending(self) -> None:
-        async with self._lock:
-            if self._future and not self._future.done():
-                self._future.cancel()
-            self._future = None
-            self._question = None
-            self._options = []
-            self._request_id = None
-            self._answer = None
+        if self._future and not self._future.done():
+            self._future.cancel()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._future = None
+        self._question = None
+        self._options = ()
+        self._request_id = None
+        self.pending_event.clear()
 
 
 decision_coordinator = DecisionCoordinator()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import suppress
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger("stdhuman.dispatch")
+
+UpdateHandler = Callable[[int | str, Optional[str], str], Awaitable[None]]
+
+MAX_CHAT_WORKERS = 32
+
+
+class _ChatWorker:
+    __slots__ = ("queue", "task", "busy")
+
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue[tuple[Optional[str], str]] = asyncio.Queue()
+        self.task: Optional[asyncio.Task[None]] = None
+        self.busy = False
+
+    def is_alive(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def is_idle(self) -> bool:
+        return not self.busy and self.queue.empty()
+
+
+class ChatDispatcher:
+    """Runs Telegram updates in order within a chat and concurrently across chats."""
+
+    def __init__(self, handler: UpdateHandler, max_workers: int = MAX_CHAT_WORKERS) -> None:
+        self._handler = handler
+        self._max_workers = max_workers
+        self._workers: OrderedDict[int | str, _ChatWorker] = OrderedDict()
+
+    def submit(self, chat_id: int | str, username: Optional[str], text: str) -> None:
+        worker = self._workers.get(chat_id)
+        if worker is None or not worker.is_alive():
+            worker = self._spawn(chat_id)
+        else:
+            self._workers.move_to_end(chat_id)
+        worker.queue.put_nowait((username, text))
+        self._evict_idle()
+
+    async def join(self) -> None:
+        for worker in list(self._workers.values()):
+            if worker.is_alive():
+                await worker.queue.join()
+
+    async def close(self) -> None:
+        workers = list(self._workers.values())
+        self._workers.clear()
+        for worker in workers:
+            if worker.task is not None:
+                worker.task.cancel()
+        for worker in workers:
+            if worker.task is not None:
+                with suppress(asyncio.CancelledError):
+                    await worker.task
+
+    def _spawn(self, chat_id: int | str) -> _ChatWorker:
+        worker = _ChatWorker()
+        worker.task = asyncio.create_task(self._run(chat_id, worker))
+        self._workers[chat_id] = worker
+        return worker
+
+    async def _run(self, chat_id: int | str, worker: _ChatWorker) -> None:
+        while True:
+            username, text = await worker.queue.get()
+            worker.busy = True
+            try:
+                await self._handler(chat_id, username, text)
+            except Exception:
+                logger.exception("Telegram update handling failed for chat %s", chat_id)
+            finally:
+                worker.busy = False
+                worker.queue.task_done()
+
+    def _evict_idle(self) -> None:
+        # Least recently used chats sit at the front of the ordered dict.
+        for chat_id, worker in list(self._workers.items()):
+            if len(self._workers) <= self._max_workers:
+                return
+            if not worker.is_idle():
+                continue
+            del self._workers[chat_id]
+            if worker.task is not None:
+                worker.task.cancel()
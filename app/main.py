@@ -1,14 +1,16 @@
 from __future__ import annotations
 
 import asyncio
-import json
+import functools
 import logging
-from typing import Any, AsyncGenerator, Dict
-from urllib.parse import urlparse
+import re
+from typing import Any, AsyncGenerator, Dict, Sequence
 
 from contextlib import suppress
+import orjson
 from fastapi import FastAPI, HTTPException, Request, Response, status
 from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 
 from app.config import settings
 from app.decision import decision_coordinator
@@ -18,17 +20,34 @@ from app.start_code import ensure_start_code_present
 from app.state import mission_manager
 from app.telegram import (
     build_question_text,
-    handle_start,
-    resolve_authorized_user_id,
-    parse_answer,
+    chat_dispatcher,
+    close_tg_client,
+    enqueue_bot_message,
+    message_batcher,
     poll_updates,
-    send_bot_message,
 )
 from app.user_store import get_cached_user_id
 
+
+class SecondCachedFormatter(logging.Formatter):
+    """Formats asctime at second resolution and reuses it within the same second."""
+
+    def __init__(self, fmt: str, datefmt: str = "%Y-%m-%d %H:%M:%S") -> None:
+        super().__init__(fmt, datefmt)
+        self._cached_second = -1
+        self._cached_time = ""
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str | None = None) -> str:
+        second = int(record.created)
+        if second != self._cached_second:
+            self._cached_time = super().formatTime(record, datefmt)
+            self._cached_second = second
+        return self._cached_time
+
+
 logger = logging.getLogger("stdhuman")
 handler = logging.StreamHandler()
-formatter = logging.Formatter("[StdHuman] %(asctime)s %(levelname)s %(message)s")
+formatter = SecondCachedFormatter("[StdHuman] %(asctime)s %(levelname)s %(message)s")
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 logger.setLevel(logging.INFO)
@@ -39,21 +58,57 @@ LOG_LEVEL_MAP: Dict[str, int] = {
     "warning": logging.WARNING,
     "error": logging.ERROR,
 }
+_LEVEL_PREFIX: Dict[str, str] = {level: level.upper() + ": " for level in LOG_LEVEL_MAP}
+
+
+class ORJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
 
-app = FastAPI(title=settings.project_name)
+app = FastAPI(title=settings.project_name, default_response_class=ORJSONResponse)
 
 MCP_SSE_KEEPALIVE_SECONDS = 15
+DISPATCH_DRAIN_TIMEOUT_SECONDS = 10
+_SSE_KEEPALIVE = b": keep-alive\n\n"
+_SSE_HEADERS: Dict[str, str] = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+_QUESTION_OPTIONS: tuple[str, ...] = ("Command", "Stop")
+
+_SUPPORTED_VERSIONS: frozenset[str] = frozenset(SUPPORTED_PROTOCOL_VERSIONS)
+_ORIGIN_RE = re.compile(r"^https?://(?:localhost|127\.0\.0\.1)(?::\d+)?(?:/.*)?$", re.IGNORECASE)
+_INVALID_REQUEST_ERROR: dict[str, Any] = {"code": -32600, "message": "Invalid Request"}
 
 
 def resolve_delivery_user_id() -> int | None:
     return get_cached_user_id()
 
 
-def normalize_question_options() -> list[str]:
-    return ["Command", "Stop"]
+def deliver_in_background(chat_id: int | str, text: str) -> None:
+    delivery = enqueue_bot_message(chat_id, text)
+    delivery.add_done_callback(_log_delivery_failure)
 
 
-def build_question_summary(question: str, options: list[str], timeout_seconds: float) -> str:
+def _log_delivery_failure(delivery: asyncio.Future[bool]) -> None:
+    if delivery.cancelled():
+        return
+    exc = delivery.exception()
+    if exc is not None:
+        logger.error("Background Telegram delivery failed: %s", exc)
+    elif not delivery.result():
+        logger.warning("Background Telegram delivery was not confirmed")
+
+
+def normalize_question_options() -> tuple[str, ...]:
+    return _QUESTION_OPTIONS
+
+
+def build_question_summary(question: str, options: Sequence[str], timeout_seconds: float) -> str:
     last_status = mission_manager.current.last_status if mission_manager.current else None
     status_text = last_status or "none"
     return f"Last status: {status_text} | Prompt: {question} | Timeout: {timeout_seconds}s"
@@ -70,64 +125,73 @@ async def start_telegram_poller() -> None:
 @app.on_event("shutdown")
 async def stop_telegram_poller() -> None:
     task = getattr(app.state, "telegram_poller", None)
-    if not task:
-        return
-    task.cancel()
-    with suppress(asyncio.CancelledError):
-        await task
+    if task:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    # Polled updates are already acknowledged to Telegram, so finish them before
+    # the workers are cancelled.
+    with suppress(asyncio.TimeoutError):
+        await asyncio.wait_for(chat_dispatcher.join(), DISPATCH_DRAIN_TIMEOUT_SECONDS)
+    await chat_dispatcher.close()
 
 
-@app.post("/v1/plan", status_code=status.HTTP_202_ACCEPTED)
-async def define_mission(payload: PlanPayload) -> Dict[str, str]:
-    mission = await mission_manager.create(payload.project, payload.steps)
-    logger.info("Defined mission %s (%s steps)", mission.id, len(mission.steps))
+@app.on_event("shutdown")
+async def flush_background_deliveries() -> None:
+    await message_batcher.close()
+
+
+@app.on_event("shutdown")
+async def close_telegram_client() -> None:
+    await close_tg_client()
+
+
+async def plan_mission(payload: PlanPayload) -> Dict[str, str]:
     chat_id = resolve_delivery_user_id()
     if chat_id is None:
         raise HTTPException(
             status_code=400,
             detail="authorized user id missing; send /start <code>",
         )
-    lines = [f"Plan started: {mission.project} ({len(mission.steps)} steps)"]
+    lines = [f"Plan started: {payload.project} ({len(payload.steps)} steps)"]
     lines.append("Steps:")
-    for idx, step in enumerate(mission.steps, start=1):
+    for idx, step in enumerate(payload.steps, start=1):
         lines.append(f"{idx}) {step}")
     summary = "\n".join(lines)
-    delivered = await send_bot_message(chat_id, summary)
+    mission, delivered = await asyncio.gather(
+        mission_manager.create(payload.project, payload.steps),
+        enqueue_bot_message(chat_id, summary),
+    )
+    logger.info("Defined mission %s (%s steps)", mission.id, len(mission.steps))
     if not delivered:
         raise HTTPException(status_code=502, detail="telegram send failed")
     return {"mission_id": mission.id}
 
 
-@app.get("/v1/health")
-async def health_check() -> Dict[str, str]:
-    return {"status": "ok"}
-
-
-@app.post("/v1/log", status_code=status.HTTP_202_ACCEPTED)
-async def report_status(payload: LogPayload) -> None:
+async def log_status(payload: LogPayload) -> None:
     log_level = LOG_LEVEL_MAP.get(payload.level, logging.INFO)
     message = payload.message
     step_text = None
     if payload.step_index is not None:
-        step_text = await mission_manager.complete_step(payload.step_index)
+        step_text = mission_manager.complete_step(payload.step_index)
         if step_text:
             message = f"{message}\n{step_text}"
-    logger.log(log_level, message)
-    await mission_manager.append_log(f"{payload.level.upper()}: {message}")
+    if logger.isEnabledFor(log_level):
+        logger.log(log_level, message)
+    prefix = _LEVEL_PREFIX.get(payload.level) or payload.level.upper() + ": "
+    mission_manager.append_log(prefix + message)
     chat_id = resolve_delivery_user_id()
     if chat_id is None:
         raise HTTPException(
             status_code=400,
             detail="authorized user id missing; send /start <code>",
         )
-    delivered = await send_bot_message(chat_id, message)
-    if not delivered:
-        raise HTTPException(status_code=502, detail="telegram send failed")
+    deliver_in_background(chat_id, message)
 
 
-@app.post("/v1/ask")
-async def human_decision(payload: AskPayload) -> Dict[str, str]:
-    logger.info("Awaiting human decision: %s", payload.question)
+async def ask_human(payload: AskPayload) -> Dict[str, str]:
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Awaiting human decision: %s", payload.question)
     if decision_coordinator.has_pending():
         await decision_coordinator.cancel_pending()
     options = normalize_question_options()
@@ -136,7 +200,8 @@ async def human_decision(payload: AskPayload) -> Dict[str, str]:
     chat_id = resolve_delivery_user_id()
     if chat_id:
         prompt = build_question_text(summary, options)
-        delivered = await send_bot_message(chat_id, prompt)
+        # Queued behind any pending logs so the prompt keeps per-chat order.
+        delivered = await enqueue_bot_message(chat_id, prompt)
         if not delivered:
             await decision_coordinator.cancel_pending()
             raise HTTPException(status_code=502, detail="telegram send failed")
@@ -153,6 +218,29 @@ async def human_decision(payload: AskPayload) -> Dict[str, str]:
         )
 
 
+@app.post("/v1/plan", status_code=status.HTTP_202_ACCEPTED, response_model=None)
+async def define_mission(payload: PlanPayload) -> ORJSONResponse:
+    result = await plan_mission(payload)
+    return ORJSONResponse(result, status_code=status.HTTP_202_ACCEPTED)
+
+
+@app.get("/v1/health", response_model=None)
+async def health_check() -> ORJSONResponse:
+    return ORJSONResponse({"status": "ok"})
+
+
+@app.post("/v1/log", status_code=status.HTTP_202_ACCEPTED, response_model=None)
+async def report_status(payload: LogPayload) -> ORJSONResponse:
+    await log_status(payload)
+    return ORJSONResponse(None, status_code=status.HTTP_202_ACCEPTED)
+
+
+@app.post("/v1/ask", response_model=None)
+async def human_decision(payload: AskPayload) -> ORJSONResponse:
+    result = await ask_human(payload)
+    return ORJSONResponse(result)
+
+
 @app.post("/telegram/webhook")
 async def telegram_webhook(payload: dict) -> dict:
     message = payload.get("message") or payload.get("edited_message")
@@ -166,66 +254,60 @@ async def telegram_webhook(payload: dict) -> dict:
     if chat_id is None:
         return {"ok": False, "error": "missing chat id"}
     username = sender.get("username") or chat.get("username")
-
-    if text.startswith("/start"):
-        await handle_start(chat_id, username, text)
-        return {"ok": True}
-
-    authorized = await resolve_authorized_user_id(chat_id, username)
-    if not authorized:
-        await send_bot_message(chat_id, "Authorization mismatch. Contact the operator.")
-        return {"ok": False, "error": "unauthorized"}
-
-    if decision_coordinator.has_pending():
-        answer = parse_answer(text, decision_coordinator.pending_options)
-        if answer:
-            await decision_coordinator.resolve(answer)
-            return {"ok": True}
-
+    chat_dispatcher.submit(chat_id, username, text)
     return {"ok": True}
 
 
 @app.post("/mcp", response_model=None)
-async def mcp_entry(request: Request) -> Response | Dict[str, Any] | StreamingResponse:
+async def mcp_entry(request: Request) -> Response:
     _validate_mcp_headers(request)
-    payload = await _load_mcp_payload(request)
-    if _is_jsonrpc_response(payload) or _is_jsonrpc_notification(payload):
-        if payload.get("method") == "notifications/initialized":
-            await mcp_lifecycle.mark_ready()
+    raw, payload = await _load_mcp_payload(request)
+    if isinstance(payload, list):
+        return await _mcp_batch_response(payload)
+    kind = _classify_jsonrpc(payload)
+    if kind == "notification":
+        await _handle_mcp_notification(payload)
         return Response(status_code=status.HTTP_202_ACCEPTED)
-    mcp_request = McpRpcRequest.model_validate(payload)
+    if kind == "response":
+        return Response(status_code=status.HTTP_202_ACCEPTED)
+    if kind == "invalid":
+        raise HTTPException(status_code=400, detail="invalid JSON-RPC payload")
+    try:
+        mcp_request = McpRpcRequest.model_validate_json(raw)
+    except ValidationError:
+        return _invalid_request_response(payload)
     if _wants_mcp_sse(request) and _should_stream_mcp(mcp_request):
         task = asyncio.create_task(
-            handle_mcp_request(mcp_request, define_mission, report_status, human_decision)
+            handle_mcp_request(mcp_request, plan_mission, log_status, ask_human)
         )
+        await asyncio.sleep(0)
+        if task.done() and _accepts_json_fast_path(request):
+            return Response(content=orjson.dumps(task.result()), media_type="application/json")
 
-        async def event_stream() -> AsyncGenerator[str, None]:
+        async def event_stream() -> AsyncGenerator[bytes, None]:
             try:
                 while True:
-                    done, _ = await asyncio.wait({task}, timeout=MCP_SSE_KEEPALIVE_SECONDS)
-                    if done:
+                    try:
+                        response_payload = await asyncio.wait_for(
+                            asyncio.shield(task), MCP_SSE_KEEPALIVE_SECONDS
+                        )
                         break
-                    yield ": keep-alive\n\n"
-                response_payload = await task
-                data = json.dumps(response_payload, ensure_ascii=True)
-                yield f"data: {data}\n\n"
+                    except asyncio.TimeoutError:
+                        yield _SSE_KEEPALIVE
+                yield b"data: " + orjson.dumps(response_payload) + b"\n\n"
             except asyncio.CancelledError:
                 task.cancel()
                 raise
 
-        headers = {
-            "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no",
-        }
-        return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
+        return _sse_response(event_stream())
 
     response_payload = await handle_mcp_request(
         mcp_request,
-        define_mission,
-        report_status,
-        human_decision,
+        plan_mission,
+        log_status,
+        ask_human,
     )
-    return response_payload
+    return Response(content=orjson.dumps(response_payload), media_type="application/json")
 
 
 @app.get("/mcp", response_model=None)
@@ -235,24 +317,19 @@ async def mcp_stream(request: Request) -> Response:
     if "text/event-stream" not in accept.lower():
         return Response(status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
     once_flag = request.query_params.get("once")
-    if once_flag and once_flag.lower() in {"1", "true", "yes"}:
-        async def event_stream() -> AsyncGenerator[str, None]:
-            yield ": keep-alive\n\n"
-        headers = {
-            "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no",
-        }
-        return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
-    async def event_stream() -> AsyncGenerator[str, None]:
-        while True:
-            yield ": keep-alive\n\n"
-            await asyncio.sleep(15)
-
-    headers = {
-        "Cache-Control": "no-cache",
-        "X-Accel-Buffering": "no",
-    }
-    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
+    once = bool(once_flag and once_flag.lower() in {"1", "true", "yes"})
+
+    async def event_stream() -> AsyncGenerator[bytes, None]:
+        yield _SSE_KEEPALIVE
+        while not once:
+            await asyncio.sleep(MCP_SSE_KEEPALIVE_SECONDS)
+            yield _SSE_KEEPALIVE
+
+    return _sse_response(event_stream())
+
+
+def _sse_response(stream: AsyncGenerator[bytes, None]) -> StreamingResponse:
+    return StreamingResponse(stream, media_type="text/event-stream", headers=_SSE_HEADERS)
 
 
 def _wants_mcp_sse(request: Request) -> bool:
@@ -268,6 +345,17 @@ def _wants_mcp_sse(request: Request) -> bool:
     return False
 
 
+def _accepts_json_fast_path(request: Request) -> bool:
+    # Explicit SSE opt-ins keep their stream even when the result is already available.
+    if "application/json" not in request.headers.get("accept", "").lower():
+        return False
+    transport = request.query_params.get("transport")
+    if transport and transport.lower() == "sse":
+        return False
+    sse_flag = request.query_params.get("sse")
+    return not (sse_flag and sse_flag.lower() in {"1", "true", "yes"})
+
+
 def _should_stream_mcp(request: McpRpcRequest) -> bool:
     if request.method != "tools/call":
         return True
@@ -280,37 +368,85 @@ def _validate_mcp_headers(request: Request) -> None:
     if origin and not _is_allowed_origin(origin):
         raise HTTPException(status_code=403, detail="origin not allowed")
     protocol_version = request.headers.get("mcp-protocol-version")
-    if protocol_version and protocol_version not in set(SUPPORTED_PROTOCOL_VERSIONS):
+    if protocol_version and protocol_version not in _SUPPORTED_VERSIONS:
         raise HTTPException(status_code=400, detail="unsupported MCP protocol version")
 
 
+@functools.lru_cache(maxsize=64)
 def _is_allowed_origin(origin: str) -> bool:
-    if origin.strip().lower() == "null":
+    cleaned = origin.strip()
+    if cleaned.lower() == "null":
         return True
-    parsed = urlparse(origin)
-    if parsed.scheme not in {"http", "https"}:
-        return False
-    host = (parsed.hostname or "").lower()
-    return host in {"localhost", "127.0.0.1"}
+    return _ORIGIN_RE.match(cleaned) is not None
 
 
-async def _load_mcp_payload(request: Request) -> dict[str, Any]:
+async def _load_mcp_payload(request: Request) -> tuple[bytes, dict[str, Any] | list[Any]]:
+    raw = await request.body()
     try:
-        payload = await request.json()
+        payload = orjson.loads(raw)
     except Exception as exc:
         raise HTTPException(status_code=400, detail="invalid JSON body") from exc
+    if isinstance(payload, list):
+        # Batch entries (and the empty batch) are validated in _mcp_batch_response.
+        return raw, payload
     if not isinstance(payload, dict) or payload.get("jsonrpc") != "2.0":
         raise HTTPException(status_code=400, detail="invalid JSON-RPC payload")
-    return payload
+    return raw, payload
 
 
-def _is_jsonrpc_notification(payload: dict[str, Any]) -> bool:
-    return "method" in payload and payload.get("id") is None
+async def _handle_mcp_notification(payload: dict[str, Any]) -> None:
+    if payload["method"] == "notifications/initialized":
+        await mcp_lifecycle.mark_ready()
 
 
-def _is_jsonrpc_response(payload: dict[str, Any]) -> bool:
-    if "method" in payload:
-        return False
-    if "id" not in payload:
-        return False
-    return "result" in payload or "error" in payload
+def _invalid_request(item: Any) -> dict[str, Any]:
+    # JSON-RPC 2.0 only allows a null id when the request id cannot be read.
+    request_id = item.get("id") if isinstance(item, dict) else None
+    if isinstance(request_id, bool) or not isinstance(request_id, (str, int)):
+        request_id = None
+    return {"jsonrpc": "2.0", "id": request_id, "error": _INVALID_REQUEST_ERROR}
+
+
+def _invalid_request_response(item: Any) -> Response:
+    return Response(
+        content=orjson.dumps(_invalid_request(item)),
+        status_code=status.HTTP_400_BAD_REQUEST,
+        media_type="application/json",
+    )
+
+
+async def _mcp_batch_response(items: list[Any]) -> Response:
+    if not items:
+        return _invalid_request_response(None)
+    # Entries run in order so a batch can initialize and then call tools.
+    responses: list[dict[str, Any]] = []
+    for item in items:
+        if not isinstance(item, dict) or item.get("jsonrpc") != "2.0":
+            responses.append(_invalid_request(item))
+            continue
+        kind = _classify_jsonrpc(item)
+        if kind == "notification":
+            await _handle_mcp_notification(item)
+        elif kind == "request":
+            try:
+                mcp_request = McpRpcRequest.model_validate(item)
+            except ValidationError:
+                responses.append(_invalid_request(item))
+                continue
+            responses.append(
+                await handle_mcp_request(mcp_request, plan_mission, log_status, ask_human)
+            )
+        elif kind == "invalid":
+            responses.append(_invalid_request(item))
+    if not responses:
+        return Response(status_code=status.HTTP_202_ACCEPTED)
+    return Response(content=orjson.dumps(responses), media_type="application/json")
+
+
+def _classify_jsonrpc(payload: dict[str, Any]) -> str:
+    method = payload.get("method")
+    if method is not None:
+        return "notification" if payload.get("id") is None else "request"
+    if "result" in payload or "error" in payload:
+        return "response"
+    return "invalid"
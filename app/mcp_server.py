@@ -1,11 +1,11 @@
 from __future__ import annotations
 
-import json
 import asyncio
-from typing import Any, Awaitable, Callable
+from typing import Any, Awaitable, Callable, NamedTuple
 
+import orjson
 from fastapi import HTTPException
-from pydantic import ValidationError
+from pydantic import TypeAdapter, ValidationError
 
 from app.schemas import AskPayload, LogPayload, McpRpcRequest, PlanPayload
 
@@ -16,6 +16,10 @@ PlanHandler = Callable[[PlanPayload], Awaitable[dict[str, str]]]
 LogHandler = Callable[[LogPayload], Awaitable[None]]
 AskHandler = Callable[[AskPayload], Awaitable[dict[str, str]]]
 
+_PLAN_ADAPTER = TypeAdapter(PlanPayload)
+_LOG_ADAPTER = TypeAdapter(LogPayload)
+_ASK_ADAPTER = TypeAdapter(AskPayload)
+
 
 class McpLifecycleState:
     def __init__(self) -> None:
@@ -43,47 +47,46 @@ class McpLifecycleState:
 mcp_lifecycle = McpLifecycleState()
 
 
-def build_tool_definitions() -> list[dict[str, Any]]:
-    return [
-        {
-            "name": "stdhuman.plan",
-            "description": "Create a mission plan and notify Telegram.",
-            "inputSchema": {
-                "type": "object",
-                "properties": {
-                    "project": {"type": "string"},
-                    "steps": {"type": "array", "items": {"type": "string"}},
-                },
-                "required": ["project", "steps"],
+_TOOL_DEFINITIONS: list[dict[str, Any]] = [
+    {
+        "name": "stdhuman.plan",
+        "description": "Create a mission plan and notify Telegram.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "project": {"type": "string"},
+                "steps": {"type": "array", "items": {"type": "string"}},
             },
+            "required": ["project", "steps"],
         },
-        {
-            "name": "stdhuman.log",
-            "description": "Send a status update and optional step completion.",
-            "inputSchema": {
-                "type": "object",
-                "properties": {
-                    "level": {"type": "string"},
-                    "message": {"type": "string"},
-                    "step_index": {"type": "integer"},
-                },
-                "required": ["level", "message"],
+    },
+    {
+        "name": "stdhuman.log",
+        "description": "Send a status update and optional step completion.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "level": {"type": "string"},
+                "message": {"type": "string"},
+                "step_index": {"type": "integer"},
             },
+            "required": ["level", "message"],
         },
-        {
-            "name": "stdhuman.ask",
-            "description": "Request a human decision via Telegram (blocking).",
-            "inputSchema": {
-                "type": "object",
-                "properties": {
-                    "question": {"type": "string"},
-                    "options": {"type": "array", "items": {"type": "string"}},
-                    "timeout": {"type": "number"},
-                },
-                "required": ["question"],
+    },
+    {
+        "name": "stdhuman.ask",
+        "description": "Request a human decision via Telegram (blocking).",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "question": {"type": "string"},
+                "options": {"type": "array", "items": {"type": "string"}},
+                "timeout": {"type": "number"},
             },
+            "required": ["question"],
         },
-    ]
+    },
+]
 
 
 def _response(request_id: str | int | None, result: dict[str, Any]) -> dict[str, Any]:
@@ -98,7 +101,7 @@ def _error(request_id: str | int | None, code: int, message: str, data: Any = No
 
 
 def _tool_success(payload: dict[str, Any]) -> dict[str, Any]:
-    text = json.dumps(payload, ensure_ascii=True)
+    text = orjson.dumps(payload).decode()
     return {
         "content": [{"type": "text", "text": text}],
         "structuredContent": payload,
@@ -106,67 +109,101 @@ def _tool_success(payload: dict[str, Any]) -> dict[str, Any]:
     }
 
 
-async def handle_mcp_request(
-    payload: McpRpcRequest,
-    plan_handler: PlanHandler,
-    log_handler: LogHandler,
-    ask_handler: AskHandler,
-) -> dict[str, Any]:
-    if payload.method == "initialize":
-        params = payload.params or {}
-        requested_version = params.get("protocolVersion")
-        if not isinstance(requested_version, str) or not requested_version:
-            return _error(payload.id, -32602, "Invalid params", [{"field": "protocolVersion"}])
-        if requested_version in SUPPORTED_PROTOCOL_VERSIONS:
-            selected_version = requested_version
-        else:
-            selected_version = DEFAULT_PROTOCOL_VERSION
-        await mcp_lifecycle.mark_initialized(selected_version)
-        result = {
-            "protocolVersion": selected_version,
-            "capabilities": {"tools": {"listChanged": False}},
-            "serverInfo": {
-                "name": "stdhuman",
-                "title": "StdHuman MCP Server",
-                "version": "0.1.0",
-            },
-            "instructions": "Use tools/list and tools/call after notifications/initialized.",
-        }
-        return _response(payload.id, result)
+_LOGGED_RESULT = _tool_success({"status": "logged"})
 
-    if payload.method == "tools/list":
-        if not await mcp_lifecycle.is_ready():
-            return _error(payload.id, -32000, "Server not initialized")
-        return _response(payload.id, {"tools": build_tool_definitions()})
+_CAPABILITIES = {"tools": {"listChanged": False}}
+_SERVER_INFO = {
+    "name": "stdhuman",
+    "title": "StdHuman MCP Server",
+    "version": "0.1.0",
+}
+_INSTRUCTIONS = "Use tools/list and tools/call after notifications/initialized."
 
-    if payload.method != "tools/call":
-        return _error(payload.id, -32601, "Method not found")
 
-    tool_name = payload.params.get("name")
-    arguments = payload.params.get("arguments") or {}
-    if tool_name not in {
-        "stdhuman.plan",
-        "stdhuman.log",
-        "stdhuman.ask",
-    }:
-        return _error(payload.id, -32602, "Unknown tool")
+class _ToolHandlers(NamedTuple):
+    plan: PlanHandler
+    log: LogHandler
+    ask: AskHandler
+
+
+async def _call_plan(handlers: _ToolHandlers, arguments: dict[str, Any]) -> dict[str, Any]:
+    result = await handlers.plan(_PLAN_ADAPTER.validate_python(arguments))
+    return _tool_success({"mission_id": result.get("mission_id")})
+
+
+async def _call_log(handlers: _ToolHandlers, arguments: dict[str, Any]) -> dict[str, Any]:
+    await handlers.log(_LOG_ADAPTER.validate_python(arguments))
+    return _LOGGED_RESULT
+
+
+async def _call_ask(handlers: _ToolHandlers, arguments: dict[str, Any]) -> dict[str, Any]:
+    result = await handlers.ask(_ASK_ADAPTER.validate_python(arguments))
+    if "answer" in result and "status" not in result:
+        result = {"status": "done", "answer": result["answer"]}
+    return _tool_success(result)
+
+
+_TOOL_DISPATCH: dict[str, Callable[[_ToolHandlers, dict[str, Any]], Awaitable[dict[str, Any]]]] = {
+    "stdhuman.plan": _call_plan,
+    "stdhuman.log": _call_log,
+    "stdhuman.ask": _call_ask,
+}
 
+
+async def _handle_initialize(payload: McpRpcRequest, handlers: _ToolHandlers) -> dict[str, Any]:
+    params = payload.params or {}
+    requested_version = params.get("protocolVersion")
+    if not isinstance(requested_version, str) or not requested_version:
+        return _error(payload.id, -32602, "Invalid params", [{"field": "protocolVersion"}])
+    if requested_version in SUPPORTED_PROTOCOL_VERSIONS:
+        selected_version = requested_version
+    else:
+        selected_version = DEFAULT_PROTOCOL_VERSION
+    await mcp_lifecycle.mark_initialized(selected_version)
+    result = {
+        "protocolVersion": selected_version,
+        "capabilities": _CAPABILITIES,
+        "serverInfo": _SERVER_INFO,
+        "instructions": _INSTRUCTIONS,
+    }
+    return _response(payload.id, result)
+
+
+async def _handle_tools_list(payload: McpRpcRequest, handlers: _ToolHandlers) -> dict[str, Any]:
+    if not await mcp_lifecycle.is_ready():
+        return _error(payload.id, -32000, "Server not initialized")
+    return _response(payload.id, {"tools": _TOOL_DEFINITIONS})
+
+
+async def _handle_tools_call(payload: McpRpcRequest, handlers: _ToolHandlers) -> dict[str, Any]:
+    tool = _TOOL_DISPATCH.get(payload.params.get("name"))
+    if tool is None:
+        return _error(payload.id, -32602, "Unknown tool")
+    arguments = payload.params.get("arguments") or {}
     try:
-        if tool_name == "stdhuman.plan":
-            result = await plan_handler(PlanPayload(**arguments))
-            return _response(payload.id, _tool_success({"mission_id": result.get("mission_id")}))
-
-        if tool_name == "stdhuman.log":
-            await log_handler(LogPayload(**arguments))
-            return _response(payload.id, _tool_success({"status": "logged"}))
-
-        result = await ask_handler(AskPayload(**arguments))
-        if "answer" in result and "status" not in result:
-            result = {"status": "done", "answer": result["answer"]}
-        return _response(payload.id, _tool_success(result))
+        return _response(payload.id, await tool(handlers, arguments))
     except ValidationError as exc:
         return _error(payload.id, -32602, "Invalid params", exc.errors())
     except HTTPException as exc:
         return _error(payload.id, -32000, str(exc.detail))
     except Exception as exc:
         return _error(payload.id, -32603, str(exc))
+
+
+_METHOD_DISPATCH: dict[str, Callable[[McpRpcRequest, _ToolHandlers], Awaitable[dict[str, Any]]]] = {
+    "initialize": _handle_initialize,
+    "tools/list": _handle_tools_list,
+    "tools/call": _handle_tools_call,
+}
+
+
+async def handle_mcp_request(
+    payload: McpRpcRequest,
+    plan_handler: PlanHandler,
+    log_handler: LogHandler,
+    ask_handler: AskHandler,
+) -> dict[str, Any]:
+    handler = _METHOD_DISPATCH.get(payload.method)
+    if handler is None:
+        return _error(payload.id, -32601, "Method not found")
+    return await handler(payload, _ToolHandlers(plan_handler, log_handler, ask_handler))
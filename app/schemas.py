@@ -1,11 +1,13 @@
 from __future__ import annotations
 
-from typing import Any, Literal
+from typing import Annotated, Any, Literal
 
 from pydantic import BaseModel, Field
 
 
 LogLevel = Literal["info", "success", "warning", "error"]
+# orjson only encodes 64-bit integers, so larger request ids are rejected up front.
+RequestId = Annotated[int, Field(ge=-(2**63), le=2**63 - 1)]
 
 
 class PlanPayload(BaseModel):
@@ -27,6 +29,6 @@ class AskPayload(BaseModel):
 
 class McpRpcRequest(BaseModel):
     jsonrpc: Literal["2.0"] = "2.0"
-    id: str | int | None = None
+    id: str | RequestId | None = None
     method: str = Field(..., min_length=1)
     params: dict[str, Any] = Field(default_factory=dict)
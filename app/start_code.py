@@ -4,36 +4,57 @@ import secrets
 import shutil
 import string
 from pathlib import Path
+from typing import MutableMapping
 
 from app.user_store import ensure_user_id_file
 
 CODE_PATH = Path(".telegram_start_code")
 CODE_LENGTH = 12
 ALPHABET = string.ascii_letters + string.digits + "-_"
+# ALPHABET has exactly 64 symbols, so the low six bits of a random byte pick one uniformly.
+_TABLE = bytes(ord(ALPHABET[i & 0x3F]) for i in range(256))
+_ALPHABET_SET = frozenset(ALPHABET)
+
+_CACHED_CODE: str | None = None
+# When set (e.g. to a dict in tests), the start code is kept here instead of in CODE_PATH.
+_storage: MutableMapping[str, str] | None = None
 
 
 def _ensure_code_file() -> Path:
-    if CODE_PATH.exists() and CODE_PATH.is_dir():
+    if CODE_PATH.is_dir():
         shutil.rmtree(CODE_PATH, ignore_errors=True)
     return CODE_PATH
 
 
-def _read_code(path: Path) -> str | None:
-    if not path.exists():
-        return None
-    text = path.read_text(encoding="utf-8").strip()
+def _read_code() -> str | None:
+    if _storage is not None:
+        text = _storage.get(CODE_PATH.name, "").strip()
+    else:
+        try:
+            text = _ensure_code_file().read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            return None
     if len(text) != CODE_LENGTH:
         return None
-    if all(char in ALPHABET for char in text):
+    if _ALPHABET_SET.issuperset(text):
         return text
     return None
 
 
+def _write_code(code: str) -> None:
+    if _storage is not None:
+        _storage[CODE_PATH.name] = code
+    else:
+        _ensure_code_file().write_text(code, encoding="utf-8")
+
+
 def _generate_code() -> str:
-    return "".join(secrets.choice(ALPHABET) for _ in range(CODE_LENGTH))
+    return secrets.token_bytes(CODE_LENGTH).translate(_TABLE).decode("ascii")
 
 
 def initialize_auth_files() -> None:
+    global _CACHED_CODE
+    _CACHED_CODE = None
     ensure_user_id_file()
     get_start_code()
 
@@ -43,10 +64,12 @@ def ensure_start_code_present() -> str:
 
 
 def get_start_code() -> str:
-    code_file = _ensure_code_file()
-    cached = _read_code(code_file)
-    if cached:
-        return cached
-    code = _generate_code()
-    code_file.write_text(code, encoding="utf-8")
+    global _CACHED_CODE
+    if _CACHED_CODE is not None:
+        return _CACHED_CODE
+    code = _read_code()
+    if not code:
+        code = _generate_code()
+        _write_code(code)
+    _CACHED_CODE = code
     return code
@@ -3,12 +3,12 @@ from __future__ import annotations
 import asyncio
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
 
 from uuid import uuid4
 
 
-@dataclass
+@dataclass(slots=True)
 class Mission:
     id: str
     project: str
@@ -16,11 +16,15 @@ class Mission:
     started_at: datetime
     last_status: Optional[str] = None
     logs: List[str] = field(default_factory=list)
-    completed_steps: List[int] = field(default_factory=list)
+    completed_steps: Set[int] = field(default_factory=set)
 
 
 class MissionManager:
-    """Tracks the latest mission context in memory."""
+    """Tracks the latest mission context in memory.
+
+    Only create takes the lock; log and step updates never await, so they are
+    already atomic on the event loop.
+    """
 
     def __init__(self) -> None:
         self._missions: Dict[str, Mission] = {}
@@ -35,24 +39,21 @@ class MissionManager:
             self._current_id = mission_id
         return mission
 
-    async def append_log(self, text: str) -> None:
-        async with self._lock:
-            current = self.current
-            if current:
-                current.logs.append(text)
-                current.last_status = text
+    def append_log(self, text: str) -> None:
+        current = self.current
+        if current:
+            current.logs.append(text)
+            current.last_status = text
 
-    async def complete_step(self, step_index: int) -> Optional[str]:
-        async with self._lock:
-            current = self.current
-            if not current:
-                return None
-            if step_index < 1 or step_index > len(current.steps):
-                return None
-            if step_index not in current.completed_steps:
-                current.completed_steps.append(step_index)
-            step_text = current.steps[step_index - 1]
-            return f"Step {step_index}/{len(current.steps)} complete: {step_text}"
+    def complete_step(self, step_index: int) -> Optional[str]:
+        current = self.current
+        if not current:
+            return None
+        if step_index < 1 or step_index > len(current.steps):
+            return None
+        current.completed_steps.add(step_index)
+        step_text = current.steps[step_index - 1]
+        return f"Step {step_index}/{len(current.steps)} complete: {step_text}"
 
     @property
     def current(self) -> Optional[Mission]:
@@ -1,22 +1,50 @@
 from __future__ import annotations
 
 import asyncio
+import hmac
 import logging
+import random
 from contextlib import suppress
+from typing import Sequence
 
-from httpx import AsyncClient
+from httpx import AsyncClient, Limits
 
 from app.start_code import get_start_code
 from app.user_store import get_cached_user_id, remember_user_id
 from app.config import settings
 from app.decision import decision_coordinator
+from app.dispatch import ChatDispatcher
 
 logger = logging.getLogger("stdhuman.telegram")
 AUTH_MISMATCH_MESSAGE = "Authorization mismatch. Contact the operator."
 AUTH_FAILED_MESSAGE = "Authorization failed. Contact the operator."
 AUTH_CODE_REQUIRED = "Authorization code required. Send /start <code>."
 AUTH_USERNAME_REQUIRED = "Authorization requires a Telegram username."
-START_DELAY_SECONDS = 2.5
+START_DENY_DELAY_RANGE = (0.05, 0.1)
+TELEGRAM_MESSAGE_LIMIT = 4096
+BATCH_MAX_MESSAGES = 8
+BATCH_MAX_WAIT_SECONDS = 0.015
+
+_API_BASE = f"https://api.telegram.org/bot{settings.telegram_bot_token}"
+_SEND_URL = f"{_API_BASE}/sendMessage"
+_POLL_URL = f"{_API_BASE}/getUpdates"
+
+_TG_CLIENT: AsyncClient | None = None
+
+
+def get_tg_client() -> AsyncClient:
+    global _TG_CLIENT
+    if _TG_CLIENT is None or _TG_CLIENT.is_closed:
+        _TG_CLIENT = AsyncClient(timeout=5, limits=Limits(max_keepalive_connections=4))
+    return _TG_CLIENT
+
+
+async def close_tg_client() -> None:
+    global _TG_CLIENT
+    client, _TG_CLIENT = _TG_CLIENT, None
+    if client is not None:
+        await client.aclose()
+
 
 def build_info_text() -> str:
     return (
@@ -26,7 +54,7 @@ def build_info_text() -> str:
     )
 
 
-def build_question_text(question: str, options: list[str]) -> str:
+def build_question_text(question: str, options: Sequence[str]) -> str:
     lines = [f"Summary: {question}"]
     if options:
         lines.append("Options:")
@@ -36,13 +64,13 @@ def build_question_text(question: str, options: list[str]) -> str:
     return "\n".join(lines)
 
 
-def parse_answer(text: str, options: list[str]) -> str | None:
+def parse_answer(text: str, options: Sequence[str]) -> str | None:
     cleaned = text.strip()
-    lowered = cleaned.lower()
-    if lowered.startswith("/answer"):
-        cleaned = cleaned[len("/answer"):].strip()
-    elif lowered == "/a" or lowered.startswith("/a "):
-        cleaned = cleaned[len("/a"):].strip()
+    # Only the command prefix is case-folded; answers themselves can be long.
+    if cleaned[:7].lower() == "/answer":
+        cleaned = cleaned[7:].strip()
+    elif cleaned[:3].lower() in ("/a", "/a "):
+        cleaned = cleaned[2:].strip()
     if not cleaned:
         return None
     if cleaned.isdigit():
@@ -53,10 +81,10 @@ def parse_answer(text: str, options: list[str]) -> str | None:
 
 
 def is_numeric(value: int | str) -> bool:
-    try:
-        return str(value).isdigit()
-    except Exception:
-        return False
+    # Chat ids normally arrive as ints; bools and negatives stay rejected as before.
+    if type(value) is int:
+        return value >= 0
+    return isinstance(value, str) and value.isdigit()
 
 
 def _is_allowed_chat(chat_id: int | str, allowed: int | None) -> bool:
@@ -67,21 +95,14 @@ def _is_allowed_chat(chat_id: int | str, allowed: int | None) -> bool:
     return False
 
 
-def _normalize_username(username: str | None) -> str | None:
-    if not username:
-        return None
-    return username.lstrip("@").lower()
-
-
-def _configured_username() -> str:
-    return settings.dev_telegram_username.lstrip("@").lower()
+_CONFIG_USERNAME = settings.dev_telegram_username.lstrip("@").lower()
 
 
 def is_authorized_username(username: str | None) -> bool:
-    normalized = _normalize_username(username)
-    if not normalized:
+    if not username:
         return False
-    return normalized == _configured_username()
+    normalized = username.lstrip("@").lower()
+    return bool(normalized) and normalized == _CONFIG_USERNAME
 
 
 async def resolve_authorized_user_id(chat_id: int | str, username: str | None) -> bool:
@@ -102,83 +123,201 @@ async def resolve_authorized_user_id(chat_id: int | str, username: str | None) -
 
 
 def _extract_start_code(text: str) -> str | None:
-    parts = text.strip().split(maxsplit=1)
+    parts = text.split(None, 1)
     if len(parts) < 2:
         return None
     return parts[1].strip() or None
 
 
+async def _deny_delay() -> None:
+    # Small jitter to slow down repeated /start attempts; code comparison is constant time.
+    await asyncio.sleep(random.uniform(*START_DENY_DELAY_RANGE))
+
+
 async def handle_start(chat_id: int | str, username: str | None, text: str) -> None:
     start_code = _extract_start_code(text)
     if not start_code:
         logger.warning("Start denied: missing code")
-        await asyncio.sleep(START_DELAY_SECONDS)
-        await send_bot_message(chat_id, AUTH_CODE_REQUIRED)
+        await _deny_delay()
+        await enqueue_bot_message(chat_id, AUTH_CODE_REQUIRED)
         return
 
     expected = get_start_code()
-    if start_code != expected:
+    if not hmac.compare_digest(start_code.encode(), expected.encode()):
         logger.warning("Start denied: invalid code")
-        await asyncio.sleep(START_DELAY_SECONDS)
-        await send_bot_message(chat_id, AUTH_FAILED_MESSAGE)
+        await _deny_delay()
+        await enqueue_bot_message(chat_id, AUTH_FAILED_MESSAGE)
         return
 
     if not is_authorized_username(username):
         logger.warning("Start denied: username mismatch")
-        await asyncio.sleep(START_DELAY_SECONDS)
-        await send_bot_message(chat_id, AUTH_USERNAME_REQUIRED)
+        await _deny_delay()
+        await enqueue_bot_message(chat_id, AUTH_USERNAME_REQUIRED)
         return
 
     stored = get_cached_user_id()
     if stored is not None and not _is_allowed_chat(chat_id, stored):
         logger.warning("Start denied: stored user id desync")
-        await asyncio.sleep(START_DELAY_SECONDS)
-        await send_bot_message(chat_id, AUTH_MISMATCH_MESSAGE)
+        await _deny_delay()
+        await enqueue_bot_message(chat_id, AUTH_MISMATCH_MESSAGE)
         return
 
     logger.info("Start authorized")
     remember_user_id(int(chat_id))
-    await asyncio.sleep(START_DELAY_SECONDS)
-    await send_bot_message(chat_id, build_info_text())
+    await enqueue_bot_message(chat_id, build_info_text())
+
+
+async def handle_message(chat_id: int | str, username: str | None, text: str) -> None:
+    if text.startswith("/start"):
+        await handle_start(chat_id, username, text)
+        return
+    authorized = await resolve_authorized_user_id(chat_id, username)
+    if not authorized:
+        await enqueue_bot_message(chat_id, AUTH_MISMATCH_MESSAGE)
+        return
+    if decision_coordinator.has_pending():
+        answer = parse_answer(text, decision_coordinator.pending_options)
+        if answer:
+            await decision_coordinator.resolve(answer)
+
+
+chat_dispatcher = ChatDispatcher(handle_message)
 
 
 async def send_bot_message(chat_id: int | str, text: str) -> bool:
     if not is_numeric(chat_id):
         raise ValueError("chat id must be numeric")
-    send_url = f"https://api.telegram.org/bot{settings.telegram_bot_token}/sendMessage"
     resolved_chat_id = int(chat_id)
-    async with AsyncClient(timeout=5) as client:
-        payload = {"chat_id": resolved_chat_id, "text": text}
-        try:
-            response = await client.post(send_url, json=payload)
-            response.raise_for_status()
-            logger.info("Telegram message sent to chat %s", resolved_chat_id)
-            return True
-        except Exception as exc:
-            body = getattr(exc, "response", None)
-            detail = None
-            if body is not None:
-                with suppress(Exception):
-                    detail = body.text
-            logger.error(
-                "Failed to send Telegram message to chat %s: %s %s",
-                resolved_chat_id,
-                exc,
-                detail or "",
-            )
-            return False
+    client = get_tg_client()
+    payload = {"chat_id": resolved_chat_id, "text": text}
+    try:
+        response = await client.post(_SEND_URL, json=payload)
+        response.raise_for_status()
+        logger.info("Telegram message sent to chat %s", resolved_chat_id)
+        return True
+    except Exception as exc:
+        body = getattr(exc, "response", None)
+        detail = None
+        if body is not None:
+            with suppress(Exception):
+                detail = body.text
+        logger.error(
+            "Failed to send Telegram message to chat %s: %s %s",
+            resolved_chat_id,
+            exc,
+            detail or "",
+        )
+        return False
+
+
+class _Chunk:
+    __slots__ = ("chat_id", "texts", "futures", "length")
+
+    def __init__(self, chat_id: int) -> None:
+        self.chat_id = chat_id
+        self.texts: list[str] = []
+        self.futures: list[asyncio.Future[bool]] = []
+        self.length = -1
+
+    def fits(self, text: str) -> bool:
+        return not self.texts or self.length + 1 + len(text) <= TELEGRAM_MESSAGE_LIMIT
+
+    def add(self, text: str, future: asyncio.Future[bool]) -> None:
+        self.texts.append(text)
+        self.futures.append(future)
+        self.length += 1 + len(text)
+
+
+class MessageBatcher:
+    """Coalesces bursts of outbound messages to the same chat into one sendMessage call."""
+
+    def __init__(
+        self,
+        max_messages: int = BATCH_MAX_MESSAGES,
+        max_wait: float = BATCH_MAX_WAIT_SECONDS,
+    ) -> None:
+        self._max_messages = max_messages
+        self._max_wait = max_wait
+        self._queue: asyncio.Queue[tuple[int, str, asyncio.Future[bool]]] | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def enqueue(self, chat_id: int | str, text: str) -> asyncio.Future[bool]:
+        if not is_numeric(chat_id):
+            raise ValueError("chat id must be numeric")
+        loop = asyncio.get_running_loop()
+        task = self._task
+        if self._queue is None or task is None or task.done() or task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run(self._queue))
+        future: asyncio.Future[bool] = loop.create_future()
+        self._queue.put_nowait((int(chat_id), text, future))
+        return future
+
+    async def join(self) -> None:
+        if self._queue is not None and self._task is not None and not self._task.done():
+            await self._queue.join()
+
+    async def close(self) -> None:
+        await self.join()
+        task, self._task, self._queue = self._task, None, None
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    async def _run(self, queue: asyncio.Queue[tuple[int, str, asyncio.Future[bool]]]) -> None:
+        while True:
+            batch = [await queue.get()]
+            await asyncio.sleep(self._max_wait)
+            while len(batch) < self._max_messages and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _flush(self, batch: list[tuple[int, str, asyncio.Future[bool]]]) -> None:
+        chunks: list[_Chunk] = []
+        open_chunks: dict[int, _Chunk] = {}
+        for chat_id, text, future in batch:
+            chunk = open_chunks.get(chat_id)
+            if chunk is None or not chunk.fits(text):
+                chunk = _Chunk(chat_id)
+                open_chunks[chat_id] = chunk
+                chunks.append(chunk)
+            chunk.add(text, future)
+        results = await asyncio.gather(
+            *(send_bot_message(chunk.chat_id, "\n".join(chunk.texts)) for chunk in chunks),
+            return_exceptions=True,
+        )
+        for chunk, result in zip(chunks, results):
+            for future in chunk.futures:
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+message_batcher = MessageBatcher()
+
+
+def enqueue_bot_message(chat_id: int | str, text: str) -> asyncio.Future[bool]:
+    return message_batcher.enqueue(chat_id, text)
 
 
 async def poll_updates() -> None:
-    url = f"https://api.telegram.org/bot{settings.telegram_bot_token}/getUpdates"
-    last_id: int | None = None
-    async with AsyncClient(timeout=30) as client:
+    poll_timeout = settings.telegram_long_poll_timeout
+    offset: int | None = None
+    async with AsyncClient(timeout=poll_timeout + 10) as client:
         while True:
-            payload: dict[str, int | float] = {"timeout": 20}
-            if last_id is not None:
-                payload["offset"] = last_id
+            payload: dict[str, int | float] = {"timeout": poll_timeout}
+            if offset is not None:
+                payload["offset"] = offset
             try:
-                response = await client.post(url, json=payload)
+                response = await client.post(_POLL_URL, json=payload)
                 response.raise_for_status()
                 data = response.json()
             except Exception as exc:
@@ -186,8 +325,9 @@ async def poll_updates() -> None:
                 await asyncio.sleep(settings.telegram_poll_interval)
                 continue
 
+            next_offset = offset
             for update in data.get("result", []):
-                last_id = update.get("update_id", last_id) + 1
+                next_offset = update.get("update_id", next_offset) + 1
                 message = update.get("message") or update.get("edited_message")
                 if not message:
                     continue
@@ -199,15 +339,7 @@ async def poll_updates() -> None:
                     continue
                 username = sender.get("username") or chat.get("username")
                 logger.info("Telegram message from chat %s: %s", chat_id, text)
-                if text.startswith("/start"):
-                    await handle_start(chat_id, username, text)
-                else:
-                    authorized = await resolve_authorized_user_id(chat_id, username)
-                    if not authorized:
-                        await send_bot_message(chat_id, AUTH_MISMATCH_MESSAGE)
-                        continue
-                    if decision_coordinator.has_pending():
-                        answer = parse_answer(text, decision_coordinator.pending_options)
-                        if answer:
-                            await decision_coordinator.resolve(answer)
-            await asyncio.sleep(settings.telegram_poll_interval)
+                chat_dispatcher.submit(chat_id, username, text)
+            # The batch is acknowledged once it is queued on the chat workers;
+            # shutdown drains those queues so acknowledged updates still run.
+            offset = next_offset
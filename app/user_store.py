@@ -5,30 +5,55 @@ from pathlib import Path
 
 USER_ID_PATH = Path(".telegram_user_id")
 
+# (file signature, user id); the signature lets a host-side edit of the
+# bind-mounted file invalidate the cache with one stat instead of a read.
+_CACHED_USER_ID: tuple[tuple[int, int] | None, int | None] | None = None
+
 
 def _resolve_user_id_file() -> Path:
-    if USER_ID_PATH.exists() and USER_ID_PATH.is_dir():
+    if USER_ID_PATH.is_dir():
         return USER_ID_PATH / "id"
     return USER_ID_PATH
 
 
 def ensure_user_id_file() -> None:
-    if USER_ID_PATH.exists() and USER_ID_PATH.is_dir():
+    global _CACHED_USER_ID
+    _CACHED_USER_ID = None
+    if USER_ID_PATH.is_dir():
         shutil.rmtree(USER_ID_PATH, ignore_errors=True)
-    if not USER_ID_PATH.exists():
-        USER_ID_PATH.write_text("", encoding="utf-8")
+    USER_ID_PATH.touch(exist_ok=True)
 
 
-def get_cached_user_id() -> int | None:
-    user_file = _resolve_user_id_file()
-    if not user_file.exists():
+def _file_signature(user_file: Path) -> tuple[int, int] | None:
+    try:
+        stat = user_file.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_user_id(user_file: Path) -> int | None:
+    try:
+        text = user_file.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
         return None
-    text = user_file.read_text(encoding="utf-8").strip()
     if not text.isdigit():
         return None
     return int(text)
 
 
+def get_cached_user_id() -> int | None:
+    global _CACHED_USER_ID
+    user_file = _resolve_user_id_file()
+    signature = _file_signature(user_file)
+    cached = _CACHED_USER_ID
+    if cached is None or cached[0] != signature:
+        cached = _CACHED_USER_ID = (signature, _read_user_id(user_file))
+    return cached[1]
+
+
 def remember_user_id(user_id: int) -> None:
+    global _CACHED_USER_ID
     user_file = _resolve_user_id_file()
     user_file.write_text(str(user_id), encoding="utf-8")
+    _CACHED_USER_ID = (_file_signature(user_file), user_id)
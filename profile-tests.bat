@@ -0,0 +1,7 @@
+@echo off
+python -m pip install "pyinstrument>=4.0"
+if "%PROFILE_OUTPUT%"=="" (
+    set PROFILE_OUTPUT=profile.html
+)
+python -m pyinstrument -i 0.0005 -r html -o %PROFILE_OUTPUT% -m pytest -q %*
+echo Profile written to %PROFILE_OUTPUT%
@@ -0,0 +1,8 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+python -m pip install "pyinstrument>=4.0"
+
+OUTPUT="${PROFILE_OUTPUT:-profile.html}"
+python -m pyinstrument -i 0.0005 -r html -o "$OUTPUT" -m pytest -q "$@"
+echo "Profile written to $OUTPUT"
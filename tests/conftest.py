@@ -1,4 +1,11 @@
+import asyncio
 import os
+from typing import Any, Awaitable, Callable
+
+import orjson
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient, Response
 
 from app.start_code import get_start_code
 
@@ -7,3 +14,87 @@ os.environ.setdefault("DEV_TELEGRAM_USERNAME", "@dev-telegram-username")
 os.environ.setdefault("TIMEOUT", "1")
 
 get_start_code()
+
+from app.decision import DecisionCoordinator  # noqa: E402  (settings read the environment at import)
+from app.main import app  # noqa: E402
+from app.state import MissionManager  # noqa: E402
+
+TRANSPORT = ASGITransport(app=app)
+
+
+async def post_json(client: AsyncClient, url: str, payload: Any, **kwargs: Any) -> Response:
+    headers = {"Content-Type": "application/json", **kwargs.pop("headers", {})}
+    return await client.post(url, content=orjson.dumps(payload), headers=headers, **kwargs)
+
+
+class FastAsync:
+    """Lightweight AsyncMock stand-in that records positional call args."""
+
+    def __init__(self, return_value: Any = True) -> None:
+        self.calls: list[tuple[Any, ...]] = []
+        self.return_value = return_value
+        self.side_effect: Callable[..., Awaitable[Any]] | None = None
+
+    async def __call__(self, *args: Any) -> Any:
+        self.calls.append(args)
+        if self.side_effect is not None:
+            return await self.side_effect(*args)
+        return self.return_value
+
+
+def read_json(response: Response) -> Any:
+    return orjson.loads(response.content)
+
+
+async def await_pending(coordinator: DecisionCoordinator) -> None:
+    await asyncio.wait_for(coordinator.pending_event.wait(), timeout=1)
+
+
+async def resolve_when_pending(coordinator: DecisionCoordinator, answer: str) -> bool:
+    await await_pending(coordinator)
+    return await coordinator.resolve(answer)
+
+
+@pytest_asyncio.fixture(scope="session")
+async def client():
+    # limits/http2 only configure httpx's own transport, so they are moot with
+    # ASGITransport; skipping proxy/env lookups is what actually saves work.
+    async with AsyncClient(
+        transport=TRANSPORT, base_url="http://test", trust_env=False, timeout=5.0
+    ) as client:
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def patched_bot(monkeypatch):
+    # Every outbound message goes through the batcher, which calls
+    # app.telegram.send_bot_message.
+    mock = FastAsync()
+    monkeypatch.setattr("app.telegram.send_bot_message", mock)
+    monkeypatch.setattr("app.main.get_cached_user_id", lambda: 123)
+    return mock
+
+
+@pytest.fixture(autouse=True)
+def no_deny_delay(request, monkeypatch):
+    # Zero the /start denial jitter rather than patching asyncio.sleep, which is
+    # module-global and would also stall the batcher and slow-send tests.
+    if request.node.get_closest_marker("real_sleep") is None:
+        monkeypatch.setattr("app.telegram.START_DENY_DELAY_RANGE", (0.0, 0.0))
+
+
+@pytest.fixture(autouse=True)
+def coordinator(monkeypatch):
+    # Fresh singletons per test, swapped in wherever the app imported them.
+    fresh = DecisionCoordinator()
+    for module in ("app.decision", "app.main", "app.telegram"):
+        monkeypatch.setattr(f"{module}.decision_coordinator", fresh)
+    return fresh
+
+
+@pytest.fixture(autouse=True)
+def missions(monkeypatch):
+    fresh = MissionManager()
+    for module in ("app.state", "app.main"):
+        monkeypatch.setattr(f"{module}.mission_manager", fresh)
+    return fresh
@@ -1,96 +1,59 @@
 import asyncio
-from unittest.mock import AsyncMock, patch
 
 import pytest
-from httpx import ASGITransport, AsyncClient
 
-from app.decision import decision_coordinator
-from app.main import app
+from tests.conftest import post_json, read_json, resolve_when_pending
 
 
+@pytest.mark.parametrize(
+    ("question", "options", "answer"),
+    [
+        pytest.param("Should we proceed?", ["Yes", "No"], "Yes", id="option"),
+        pytest.param("Share update?", ["Yes", "No"], "Yes", id="configured-chat"),
+        pytest.param("Share a note", [], "free text", id="free-text"),
+    ],
+)
 @pytest.mark.asyncio
-async def test_ask_endpoint_receives_answer():
-    question = "Should we proceed?"
-    options = ["Yes", "No"]
-    transport = ASGITransport(app=app)
-    with patch("app.main.get_cached_user_id", return_value=123), patch(
-        "app.main.send_bot_message",
-        new_callable=AsyncMock,
-    ) as mock_send:
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            ask_task = asyncio.create_task(
-                client.post("/v1/ask", json={"question": question, "options": options})
-            )
-            await asyncio.sleep(0)
-            resolved = await decision_coordinator.resolve("Yes")
-            assert resolved is True
-            response = await ask_task
-            assert response.status_code == 200
-            assert response.json()["answer"] == "Yes"
-        mock_send.assert_awaited_once()
-        sent_prompt = mock_send.call_args[0][1]
-        assert "Summary:" in sent_prompt
-        assert "Timeout:" in sent_prompt
-        assert "1) Command" in sent_prompt
-        assert "2) Stop" in sent_prompt
+async def test_ask_endpoint_receives_answer(
+    client, patched_bot, coordinator, question, options, answer
+):
+    async with asyncio.TaskGroup() as tg:
+        ask_task = tg.create_task(
+            post_json(client, "/v1/ask", {"question": question, "options": options})
+        )
+        resolve_task = tg.create_task(resolve_when_pending(coordinator, answer))
+    assert resolve_task.result() is True
+    response = ask_task.result()
+    assert response.status_code == 200
+    assert read_json(response)["answer"] == answer
+    assert len(patched_bot.calls) == 1
+    chat_id, sent_prompt = patched_bot.calls[-1]
+    assert chat_id == 123
+    assert "Summary:" in sent_prompt
+    assert "Timeout:" in sent_prompt
+    assert "1) Command" in sent_prompt
+    assert "2) Stop" in sent_prompt
 
 
 @pytest.mark.asyncio
-async def test_ask_endpoint_uses_configured_chat_id():
-    question = "Share update?"
-    options = ["Yes", "No"]
-    transport = ASGITransport(app=app)
-    with patch("app.main.get_cached_user_id", return_value=123), patch(
-        "app.main.send_bot_message", new_callable=AsyncMock
-    ) as mock_send:
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            ask_task = asyncio.create_task(
-                client.post("/v1/ask", json={"question": question, "options": options})
-            )
-            await asyncio.sleep(0)
-            resolved = await decision_coordinator.resolve("Yes")
-            assert resolved is True
-            response = await ask_task
-            assert response.status_code == 200
-            assert response.json()["answer"] == "Yes"
-        mock_send.assert_awaited_once()
-        args, _ = mock_send.call_args
-        assert args[0] == 123
-
-
-@pytest.mark.asyncio
-async def test_ask_endpoint_allows_free_text():
-    transport = ASGITransport(app=app)
-    with patch("app.main.get_cached_user_id", return_value=123), patch(
-        "app.main.send_bot_message",
-        new_callable=AsyncMock,
-    ) as mock_send:
-        mock_send.return_value = True
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            ask_task = asyncio.create_task(
-                client.post("/v1/ask", json={"question": "Share a note", "options": []})
-            )
-            await asyncio.sleep(0)
-            resolved = await decision_coordinator.resolve("free text")
-            assert resolved is True
-            response = await ask_task
-            assert response.status_code == 200
-            assert response.json()["answer"] == "free text"
-        mock_send.assert_awaited_once()
+async def test_ask_endpoint_timeouts_when_no_answer(client):
+    question = "Timeout check?"
+    options = ["Do", "Don't"]
+    response = await post_json(
+        client,
+        "/v1/ask",
+        {"question": question, "options": options, "timeout": 0.05},
+    )
+    assert response.status_code == 408
+    assert read_json(response)["detail"] == "timeout waiting for human response"
 
 
 @pytest.mark.asyncio
-async def test_ask_endpoint_timeouts_when_no_answer():
-    question = "Timeout check?"
-    options = ["Do", "Don't"]
-    transport = ASGITransport(app=app)
-    with patch("app.main.send_bot_message", new_callable=AsyncMock) as mock_send:
-        mock_send.return_value = True
-        with patch("app.main.get_cached_user_id", return_value=123):
-            async with AsyncClient(transport=transport, base_url="http://test", timeout=5.0) as client:
-                response = await client.post(
-                    "/v1/ask",
-                    json={"question": question, "options": options, "timeout": 0.05},
-                )
-                assert response.status_code == 408
-                assert response.json()["detail"] == "timeout waiting for human response"
+async def test_ask_prompt_follows_preceding_log(client, patched_bot, coordinator):
+    log_response = await post_json(client, "/v1/log", {"level": "info", "message": "LOG FIRST"})
+    assert log_response.status_code == 202
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(post_json(client, "/v1/ask", {"question": "Proceed?", "options": []}))
+        tg.create_task(resolve_when_pending(coordinator, "Yes"))
+    sent = "\n".join(text for _, text in patched_bot.calls)
+    assert sent.index("LOG FIRST") < sent.index("Summary:")
@@ -1,237 +1,274 @@
 import asyncio
-import json
-from unittest.mock import AsyncMock, patch
+from typing import AsyncIterator
+from unittest.mock import patch
 
+import orjson
 import pytest
-from httpx import ASGITransport, AsyncClient
+import pytest_asyncio
+from httpx import AsyncClient, Request, Response
 
-from app.decision import decision_coordinator
-from app.main import app
+from app.telegram import message_batcher
+from tests.conftest import TRANSPORT, post_json, read_json, resolve_when_pending
 
+JSON_SSE_HEADERS = {
+    "Accept": "application/json, text/event-stream",
+    "Content-Type": "application/json",
+}
+SSE_ACCEPT = {"Accept": "text/event-stream"}
+
+# Request envelopes are serialized once and sent as raw content.
+INIT_BODY = orjson.dumps(
+    {
+        "jsonrpc": "2.0",
+        "id": 0,
+        "method": "initialize",
+        "params": {
+            "protocolVersion": "2025-06-18",
+            "capabilities": {},
+            "clientInfo": {"name": "pytest", "version": "0.1.0"},
+        },
+    }
+)
+INITIALIZED_BODY = orjson.dumps({"jsonrpc": "2.0", "method": "notifications/initialized"})
+TOOLS_LIST_BODY = orjson.dumps({"jsonrpc": "2.0", "id": 1, "method": "tools/list"})
+PING_BODY = orjson.dumps(
+    {"jsonrpc": "2.0", "method": "notifications/ping", "params": {"hello": "world"}}
+)
+
+
+def _tool_call_body(request_id: int, name: str, arguments: dict) -> bytes:
+    return orjson.dumps(
+        {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": "tools/call",
+            "params": {"name": name, "arguments": arguments},
+        }
+    )
+
+
+PLAN_BODY = _tool_call_body(2, "stdhuman.plan", {"project": "Test Mission", "steps": ["step 1"]})
+ASK_BODY = _tool_call_body(4, "stdhuman.ask", {"question": "Proceed?", "options": ["Yes", "No"]})
+ASK_TIMEOUT_BODY = _tool_call_body(
+    5, "stdhuman.ask", {"question": "Proceed?", "options": ["Yes", "No"], "timeout": 0.05}
+)
+SLOW_PLAN_BODY = _tool_call_body(
+    6, "stdhuman.plan", {"project": "Slow Mission", "steps": ["step 1"]}
+)
 
-def _parse_sse_payload(response_text: str) -> dict:
-    data_lines = [line for line in response_text.splitlines() if line.startswith("data:")]
-    assert data_lines
-    raw = data_lines[-1][len("data:"):].strip()
-    return json.loads(raw)
 
+async def _parse_sse_lines(lines: AsyncIterator[str]) -> dict:
+    async for line in lines:
+        if line.startswith("data:"):
+            return orjson.loads(line[len("data:"):])
+    raise AssertionError("SSE stream ended without a data event")
 
-def _parse_mcp_response(response) -> dict:
+
+async def _parse_mcp_response(response: Response) -> dict:
     if response.headers.get("content-type", "").startswith("text/event-stream"):
-        return _parse_sse_payload(response.text)
-    return response.json()
+        return await _parse_sse_lines(response.aiter_lines())
+    await response.aread()
+    return read_json(response)
+
+
+async def _call_mcp(client: AsyncClient, body: bytes) -> tuple[Response, dict]:
+    async with client.stream("POST", "/mcp", content=body, headers=JSON_SSE_HEADERS) as response:
+        return response, await _parse_mcp_response(response)
 
 
 async def _mcp_initialize(client: AsyncClient) -> None:
-    response = await client.post(
-        "/mcp",
-        json={
-            "jsonrpc": "2.0",
-            "id": 0,
-            "method": "initialize",
-            "params": {
-                "protocolVersion": "2025-06-18",
-                "capabilities": {},
-                "clientInfo": {"name": "pytest", "version": "0.1.0"},
-            },
-        },
-        headers={"Accept": "application/json, text/event-stream"},
-    )
+    response, payload = await _call_mcp(client, INIT_BODY)
     assert response.status_code == 200
-    payload = _parse_mcp_response(response)
     assert payload["result"]["protocolVersion"] == "2025-06-18"
-    initialized = await client.post(
-        "/mcp",
-        json={"jsonrpc": "2.0", "method": "notifications/initialized"},
-        headers={"Accept": "application/json, text/event-stream"},
-    )
+    initialized = await client.post("/mcp", content=INITIALIZED_BODY, headers=JSON_SSE_HEADERS)
     assert initialized.status_code == 202
 
 
-async def _wait_for_pending() -> None:
-    for _ in range(10):
-        if decision_coordinator.has_pending():
-            return
-        await asyncio.sleep(0)
+async def _batch_call(client: AsyncClient, calls: list[dict]) -> Response:
+    return await post_json(client, "/mcp", calls, headers=JSON_SSE_HEADERS)
+
+
+@pytest_asyncio.fixture(scope="session")
+async def mcp_initialized_client(client):
+    # The lifecycle state lives on the server, so one handshake covers the session.
+    await _mcp_initialize(client)
+    return client
 
 
 @pytest.mark.asyncio
-async def test_mcp_tools_list():
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        await _mcp_initialize(client)
-        response = await client.post(
-            "/mcp",
-            json={"jsonrpc": "2.0", "id": 1, "method": "tools/list"},
-            headers={"Accept": "application/json, text/event-stream"},
-        )
+async def test_mcp_allows_null_origin_and_legacy_protocol(mcp_initialized_client):
+    response = await mcp_initialized_client.post(
+        "/mcp",
+        content=TOOLS_LIST_BODY,
+        headers={**JSON_SSE_HEADERS, "Origin": "null", "Mcp-Protocol-Version": "2024-11-05"},
+    )
     assert response.status_code == 200
-    assert response.headers["content-type"].startswith("text/event-stream")
-    payload = _parse_mcp_response(response)
-    tools = payload["result"]["tools"]
-    names = {tool["name"] for tool in tools}
-    assert {"stdhuman.plan", "stdhuman.log", "stdhuman.ask"}.issubset(names)
 
 
 @pytest.mark.asyncio
-async def test_mcp_allows_null_origin_and_legacy_protocol():
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        await _mcp_initialize(client)
-        response = await client.post(
-            "/mcp",
-            json={"jsonrpc": "2.0", "id": 1, "method": "tools/list"},
-            headers={
-                "Accept": "application/json, text/event-stream",
-                "Origin": "null",
-                "Mcp-Protocol-Version": "2024-11-05",
-            },
-        )
+async def test_mcp_rejects_foreign_origin(client):
+    response = await client.post(
+        "/mcp",
+        content=TOOLS_LIST_BODY,
+        headers={**JSON_SSE_HEADERS, "Origin": "http://localhost.example.com"},
+    )
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_mcp_tool_call_plan(mcp_initialized_client):
+    response, payload = await _call_mcp(mcp_initialized_client, PLAN_BODY)
     assert response.status_code == 200
+    assert "structuredContent" in payload["result"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("url", "headers"),
+    [
+        ("/mcp", {**SSE_ACCEPT, "Content-Type": "application/json"}),
+        ("/mcp?transport=sse", {"Content-Type": "application/json"}),
+    ],
+)
+async def test_mcp_sse_only_client_gets_stream(mcp_initialized_client, url, headers):
+    async with mcp_initialized_client.stream(
+        "POST", url, content=TOOLS_LIST_BODY, headers=headers
+    ) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        payload = await _parse_sse_lines(response.aiter_lines())
+    assert payload["id"] == 1
+
+
+@pytest.mark.asyncio
+async def test_mcp_slow_tool_call_streams_sse(mcp_initialized_client, patched_bot):
+    async def slow_send(chat_id, text):
+        await asyncio.sleep(0.05)
+        return True
+
+    patched_bot.side_effect = slow_send
+    with patch("app.main.MCP_SSE_KEEPALIVE_SECONDS", 0.01):
+        async with mcp_initialized_client.stream(
+            "POST", "/mcp", content=SLOW_PLAN_BODY, headers=JSON_SSE_HEADERS
+        ) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            lines = response.aiter_lines()
+            assert (await anext(lines)).startswith(": keep-alive")
+            payload = await _parse_sse_lines(lines)
+    assert "mission_id" in payload["result"]["structuredContent"]
 
 
-@patch("app.main.send_bot_message", new_callable=AsyncMock)
 @pytest.mark.asyncio
-async def test_mcp_tool_call_plan(mock_send):
-    transport = ASGITransport(app=app)
-    mock_send.return_value = True
-    with patch("app.main.get_cached_user_id", return_value=123):
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            await _mcp_initialize(client)
-            response = await client.post(
-                "/mcp",
-                json={
-                    "jsonrpc": "2.0",
-                    "id": 2,
-                    "method": "tools/call",
-                    "params": {
-                        "name": "stdhuman.plan",
-                        "arguments": {"project": "Test Mission", "steps": ["step 1"]},
-                    },
+async def test_mcp_batch_lists_tools_and_logs(mcp_initialized_client, patched_bot):
+    response = await _batch_call(
+        mcp_initialized_client,
+        [
+            {"jsonrpc": "2.0", "id": 1, "method": "tools/list"},
+            {"jsonrpc": "2.0", "method": "notifications/ping"},
+            {
+                "jsonrpc": "2.0",
+                "id": 3,
+                "method": "tools/call",
+                "params": {
+                    "name": "stdhuman.log",
+                    "arguments": {"level": "info", "message": "Update"},
                 },
-                headers={"Accept": "application/json, text/event-stream"},
-            )
+            },
+            {"jsonrpc": "2.0", "id": 9},
+        ],
+    )
+    await message_batcher.join()
     assert response.status_code == 200
-    payload = _parse_mcp_response(response)["result"]
-    assert "structuredContent" in payload
+    assert response.headers["content-type"].startswith("application/json")
+    tools_list, logged, invalid = read_json(response)
+    names = {tool["name"] for tool in tools_list["result"]["tools"]}
+    assert {"stdhuman.plan", "stdhuman.log", "stdhuman.ask"}.issubset(names)
+    assert logged["id"] == 3
+    assert logged["result"]["structuredContent"]["status"] == "logged"
+    assert invalid["error"]["code"] == -32600
+    assert invalid["id"] == 9
+    assert patched_bot.calls == [(123, "Update")]
 
 
-@patch("app.main.send_bot_message", new_callable=AsyncMock)
 @pytest.mark.asyncio
-async def test_mcp_tool_call_log(mock_send):
-    transport = ASGITransport(app=app)
-    mock_send.return_value = True
-    with patch("app.main.get_cached_user_id", return_value=123):
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            await _mcp_initialize(client)
-            response = await client.post(
-                "/mcp",
-                json={
-                    "jsonrpc": "2.0",
-                    "id": 3,
-                    "method": "tools/call",
-                    "params": {
-                        "name": "stdhuman.log",
-                        "arguments": {"level": "info", "message": "Update"},
-                    },
-                },
-                headers={"Accept": "application/json, text/event-stream"},
-            )
+async def test_mcp_batch_invalid_entries_echo_readable_ids(mcp_initialized_client):
+    response = await _batch_call(
+        mcp_initialized_client,
+        [{"jsonrpc": "2.0", "id": 5, "method": 7}, {"jsonrpc": "2.0", "id": [1]}, 3],
+    )
     assert response.status_code == 200
-    payload = _parse_mcp_response(response)["result"]["structuredContent"]
-    assert payload["status"] == "logged"
+    assert [entry["id"] for entry in read_json(response)] == [5, None, None]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "body",
+    [
+        b'{"jsonrpc":"2.0","id":99999999999999999999999,"method":"initialize"}',
+        b'{"jsonrpc":"2.0","id":5,"method":7}',
+    ],
+    ids=["oversized-id", "non-string-method"],
+)
+async def test_mcp_single_invalid_request_returns_jsonrpc_error(client, body):
+    response = await client.post("/mcp", content=body, headers=JSON_SSE_HEADERS)
+    assert response.status_code == 400
+    assert read_json(response)["error"]["code"] == -32600
+
+
+@pytest.mark.asyncio
+async def test_mcp_empty_batch_returns_single_invalid_request(client):
+    response = await _batch_call(client, [])
+    assert response.status_code == 400
+    assert read_json(response) == {
+        "jsonrpc": "2.0",
+        "id": None,
+        "error": {"code": -32600, "message": "Invalid Request"},
+    }
 
 
-@patch("app.main.send_bot_message", new_callable=AsyncMock)
 @pytest.mark.asyncio
-async def test_mcp_tool_call_ask(mock_send):
-    transport = ASGITransport(app=app)
-    mock_send.return_value = True
-    with patch("app.main.get_cached_user_id", return_value=123):
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            await _mcp_initialize(client)
-            task = asyncio.create_task(
-                client.post(
-                    "/mcp",
-                    json={
-                        "jsonrpc": "2.0",
-                        "id": 4,
-                        "method": "tools/call",
-                        "params": {
-                            "name": "stdhuman.ask",
-                            "arguments": {"question": "Proceed?", "options": ["Yes", "No"]},
-                        },
-                    },
-                    headers={"Accept": "application/json, text/event-stream"},
-                )
-            )
-            await _wait_for_pending()
-            resolved = await decision_coordinator.resolve("Yes")
-            assert resolved is True
-            response = await task
+async def test_mcp_tool_call_ask(mcp_initialized_client, coordinator):
+    async with asyncio.TaskGroup() as tg:
+        call_task = tg.create_task(_call_mcp(mcp_initialized_client, ASK_BODY))
+        resolve_task = tg.create_task(resolve_when_pending(coordinator, "Yes"))
+    assert resolve_task.result() is True
+    response, payload = call_task.result()
     assert response.status_code == 200
-    payload = _parse_mcp_response(response)["result"]["structuredContent"]
-    assert payload["answer"] == "Yes"
+    assert payload["result"]["structuredContent"]["answer"] == "Yes"
 
 
-@patch("app.main.send_bot_message", new_callable=AsyncMock)
 @pytest.mark.asyncio
-async def test_mcp_tool_call_ask_respects_timeout(mock_send):
-    transport = ASGITransport(app=app)
-    mock_send.return_value = True
-    with patch("app.main.get_cached_user_id", return_value=123):
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            await _mcp_initialize(client)
-            response = await client.post(
-                "/mcp",
-                json={
-                    "jsonrpc": "2.0",
-                    "id": 5,
-                    "method": "tools/call",
-                    "params": {
-                        "name": "stdhuman.ask",
-                        "arguments": {
-                            "question": "Proceed?",
-                            "options": ["Yes", "No"],
-                            "timeout": 0.05,
-                        },
-                    },
-                },
-                headers={"Accept": "application/json, text/event-stream"},
-            )
+async def test_mcp_tool_call_ask_respects_timeout(mcp_initialized_client):
+    response, payload = await _call_mcp(mcp_initialized_client, ASK_TIMEOUT_BODY)
     assert response.status_code == 200
-    payload = _parse_mcp_response(response)
     assert "error" in payload
     assert "timeout" in payload["error"]["message"]
 
 
 @pytest.mark.asyncio
 async def test_mcp_notification_returns_202():
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        response = await client.post(
-            "/mcp",
-            json={
-                "jsonrpc": "2.0",
-                "method": "notifications/ping",
-                "params": {"hello": "world"},
-            },
-            headers={"Accept": "application/json, text/event-stream"},
-        )
+    # Only the status matters here, so skip the AsyncClient and hit the transport.
+    request = Request("POST", "http://test/mcp", content=PING_BODY, headers=JSON_SSE_HEADERS)
+    response = await TRANSPORT.handle_async_request(request)
+    await response.aclose()
     assert response.status_code == 202
 
 
 @pytest.mark.asyncio
-async def test_mcp_get_stream_returns_sse():
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        await _mcp_initialize(client)
-        async with client.stream(
-            "GET",
-            "/mcp?once=1",
-            headers={"Accept": "text/event-stream"},
-        ) as response:
-            assert response.status_code == 200
-            assert response.headers["content-type"].startswith("text/event-stream")
-            first_line = await asyncio.wait_for(response.aiter_lines().__anext__(), timeout=1)
-            assert first_line.startswith(":")
+async def test_mcp_client_response_returns_202_and_rejects_unknown_shape(client):
+    response = await post_json(
+        client, "/mcp", {"jsonrpc": "2.0", "id": 7, "result": {}}, headers=JSON_SSE_HEADERS
+    )
+    invalid = await post_json(client, "/mcp", {"jsonrpc": "2.0", "id": 8}, headers=JSON_SSE_HEADERS)
+    assert response.status_code == 202
+    assert invalid.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_mcp_get_stream_returns_sse(mcp_initialized_client):
+    async with mcp_initialized_client.stream("GET", "/mcp?once=1", headers=SSE_ACCEPT) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        first_line = await asyncio.wait_for(response.aiter_lines().__anext__(), timeout=1)
+        assert first_line.startswith(":")
@@ -1,5 +1,10 @@
+import os
 from pathlib import Path
 
+import pytest
+
+import app.start_code
+import app.user_store
 from app.start_code import (
     ALPHABET,
     CODE_LENGTH,
@@ -7,16 +12,23 @@ from app.start_code import (
     get_start_code,
     initialize_auth_files,
 )
+from app.user_store import get_cached_user_id, remember_user_id
 
 
-def test_get_start_code_persists(monkeypatch, tmp_path):
-    monkeypatch.chdir(tmp_path)
+@pytest.fixture(autouse=True)
+def _reset_auth_caches(monkeypatch):
+    monkeypatch.setattr(app.start_code, "_CACHED_CODE", None)
+    monkeypatch.setattr(app.user_store, "_CACHED_USER_ID", None)
+
+
+def test_get_start_code_persists(monkeypatch):
+    storage: dict[str, str] = {}
+    monkeypatch.setattr(app.start_code, "_storage", storage)
     code = get_start_code()
     assert len(code) == CODE_LENGTH
     assert all(char in ALPHABET for char in code)
-    code_path = Path(".telegram_start_code")
-    assert code_path.exists()
-    assert code_path.read_text(encoding="utf-8").strip() == code
+    assert storage == {".telegram_start_code": code}
+    monkeypatch.setattr(app.start_code, "_CACHED_CODE", None)
     assert get_start_code() == code
 
 
@@ -31,7 +43,33 @@ def test_ensure_start_code_present_creates_file(monkeypatch, tmp_path):
     monkeypatch.chdir(tmp_path)
     code = ensure_start_code_present()
     assert len(code) == CODE_LENGTH
-    assert all(char in ALPHABET for char in code)
     code_path = Path(".telegram_start_code")
-    assert code_path.exists()
     assert code_path.read_text(encoding="utf-8").strip() == code
+
+
+def test_get_start_code_replaces_invalid_stored_code(monkeypatch):
+    storage = {".telegram_start_code": "not a code"}
+    monkeypatch.setattr(app.start_code, "_storage", storage)
+    code = get_start_code()
+    assert code != "not a code"
+    assert storage[".telegram_start_code"] == code
+
+
+def test_cached_user_id_tracks_remembered_user(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    initialize_auth_files()
+    assert get_cached_user_id() is None
+    remember_user_id(42)
+    assert get_cached_user_id() == 42
+
+
+def test_cached_user_id_follows_external_file_changes(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    initialize_auth_files()
+    remember_user_id(42)
+    user_file = Path(".telegram_user_id")
+    mtime_ns = user_file.stat().st_mtime_ns
+    # Clearing the bind-mounted file on the host revokes the user without a restart.
+    user_file.write_text("", encoding="utf-8")
+    os.utime(user_file, ns=(mtime_ns + 1_000_000, mtime_ns + 1_000_000))
+    assert get_cached_user_id() is None
@@ -1,15 +1,34 @@
-from unittest.mock import AsyncMock, patch
+import asyncio
+from contextlib import suppress
+from unittest.mock import patch
 
+import httpx
+import orjson
 import pytest
-from httpx import ASGITransport, AsyncClient
+from httpx import AsyncClient
 
-from app.main import app
-from app.telegram import build_info_text, parse_answer
+from app.config import settings
+from app.dispatch import ChatDispatcher
+from app.main import stop_telegram_poller
+from app.telegram import (
+    AUTH_CODE_REQUIRED,
+    AUTH_MISMATCH_MESSAGE,
+    START_DENY_DELAY_RANGE,
+    MessageBatcher,
+    _extract_start_code,
+    build_info_text,
+    chat_dispatcher,
+    handle_start,
+    message_batcher,
+    parse_answer,
+    poll_updates,
+    send_bot_message,
+)
+from tests.conftest import post_json, read_json
 
 
-@patch("app.telegram.send_bot_message", new_callable=AsyncMock)
 @pytest.mark.asyncio
-async def test_telegram_webhook_start(mock_send):
+async def test_telegram_webhook_start(client, patched_bot):
     payload = {
         "message": {
             "chat": {"id": 123},
@@ -17,22 +36,21 @@ async def test_telegram_webhook_start(mock_send):
             "text": "/start CODE",
         }
     }
-    transport = ASGITransport(app=app)
     with patch("app.telegram.get_start_code", return_value="CODE"), patch(
         "app.telegram.remember_user_id"
     ) as mock_remember, patch(
         "app.telegram.get_cached_user_id",
         return_value=None,
-    ), patch("app.telegram.asyncio.sleep", new_callable=AsyncMock):
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            response = await client.post("/telegram/webhook", json=payload)
-    assert response.json() == {"ok": True}
+    ):
+        response = await post_json(client, "/telegram/webhook", payload)
+        await chat_dispatcher.join()
+    assert read_json(response) == {"ok": True}
     mock_remember.assert_called_once_with(123)
-    mock_send.assert_awaited_once_with(123, build_info_text())
+    assert patched_bot.calls == [(123, build_info_text())]
 
 
 @pytest.mark.asyncio
-async def test_telegram_webhook_rejects_unauthorized_chat():
+async def test_telegram_webhook_rejects_unauthorized_chat(client, patched_bot):
     payload = {
         "message": {
             "chat": {"id": 321},
@@ -40,30 +58,195 @@ async def test_telegram_webhook_rejects_unauthorized_chat():
             "text": "hello",
         }
     }
-    transport = ASGITransport(app=app)
-    with patch("app.telegram.get_cached_user_id", return_value=123), patch(
-        "app.main.send_bot_message", new_callable=AsyncMock
-    ) as mock_send:
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            response = await client.post("/telegram/webhook", json=payload)
-    assert response.json()["error"] == "unauthorized"
-    mock_send.assert_awaited()
+    with patch("app.telegram.get_cached_user_id", return_value=123):
+        response = await post_json(client, "/telegram/webhook", payload)
+        await chat_dispatcher.join()
+    assert read_json(response) == {"ok": True}
+    assert patched_bot.calls == [(321, AUTH_MISMATCH_MESSAGE)]
 
 
 @pytest.mark.asyncio
-async def test_telegram_webhook_requires_start_code():
+async def test_telegram_webhook_requires_start_code(client, patched_bot):
     payload = {"message": {"chat": {"id": 123}, "text": "/start"}}
-    transport = ASGITransport(app=app)
-    with patch("app.telegram.asyncio.sleep", new_callable=AsyncMock), patch(
-        "app.telegram.send_bot_message",
-        new_callable=AsyncMock,
-    ) as mock_send:
-        async with AsyncClient(transport=transport, base_url="http://test") as client:
-            response = await client.post("/telegram/webhook", json=payload)
-    assert response.json() == {"ok": True}
-    mock_send.assert_awaited()
-
-
-def test_parse_answer_accepts_short_command():
-    options = ["Yes", "No"]
-    assert parse_answer("Yes", options) == "Yes"
+    response = await post_json(client, "/telegram/webhook", payload)
+    await chat_dispatcher.join()
+    assert read_json(response) == {"ok": True}
+    assert patched_bot.calls
+
+
+@pytest.mark.real_sleep
+@pytest.mark.asyncio
+async def test_start_denial_is_delayed(patched_bot):
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await handle_start(123, None, "/start")
+    await message_batcher.join()
+    assert loop.time() - started >= START_DENY_DELAY_RANGE[0]
+    assert patched_bot.calls == [(123, AUTH_CODE_REQUIRED)]
+
+
+@pytest.mark.asyncio
+async def test_chat_dispatcher_orders_within_chat_and_overlaps_chats():
+    release = asyncio.Event()
+    handled: list[tuple[int, str]] = []
+
+    async def handler(chat_id, username, text):
+        if text == "slow":
+            await release.wait()
+        handled.append((chat_id, text))
+
+    dispatcher = ChatDispatcher(handler)
+    dispatcher.submit(1, None, "slow")
+    dispatcher.submit(1, None, "after slow")
+    dispatcher.submit(2, None, "other chat")
+    await asyncio.sleep(0)
+    assert handled == [(2, "other chat")]
+    release.set()
+    await dispatcher.join()
+    assert handled == [(2, "other chat"), (1, "slow"), (1, "after slow")]
+    await dispatcher.close()
+
+
+@pytest.mark.asyncio
+async def test_chat_dispatcher_evicts_only_idle_workers():
+    release = asyncio.Event()
+    handled: list[tuple[int, str]] = []
+
+    async def handler(chat_id, username, text):
+        if text == "slow":
+            await release.wait()
+        handled.append((chat_id, text))
+
+    dispatcher = ChatDispatcher(handler, max_workers=1)
+    dispatcher.submit(1, None, "first")
+    await dispatcher.join()
+    idle_task = dispatcher._workers[1].task
+
+    dispatcher.submit(2, None, "slow")
+    await asyncio.sleep(0)
+    assert list(dispatcher._workers) == [2]
+    assert idle_task.cancelled()
+
+    # Chat 2 is busy, so going over the cap leaves both workers in place.
+    dispatcher.submit(3, None, "third")
+    assert list(dispatcher._workers) == [2, 3]
+    release.set()
+    await dispatcher.join()
+    assert sorted(handled) == [(1, "first"), (2, "slow"), (3, "third")]
+    await dispatcher.close()
+
+
+@pytest.mark.asyncio
+async def test_poll_updates_acknowledges_and_dispatches(monkeypatch):
+    bodies: list[dict] = []
+    acknowledged = asyncio.Event()
+    submitted: list[tuple[int, str | None, str]] = []
+    update = {
+        "update_id": 41,
+        "message": {"text": " /answer 1 ", "from": {"username": "dev"}, "chat": {"id": 7}},
+    }
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        bodies.append(orjson.loads(request.content))
+        if len(bodies) == 1:
+            return httpx.Response(200, json={"ok": True, "result": [update]})
+        acknowledged.set()
+        # A failed poll makes the loop back off, which lets the test cancel it.
+        return httpx.Response(503)
+
+    def client_factory(**kwargs):
+        return AsyncClient(transport=httpx.MockTransport(handler), **kwargs)
+
+    class RecordingDispatcher:
+        def submit(self, chat_id, username, text):
+            submitted.append((chat_id, username, text))
+
+    monkeypatch.setattr("app.telegram.AsyncClient", client_factory)
+    monkeypatch.setattr("app.telegram.chat_dispatcher", RecordingDispatcher())
+    task = asyncio.create_task(poll_updates())
+    try:
+        await asyncio.wait_for(acknowledged.wait(), timeout=1)
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    assert bodies[0] == {"timeout": settings.telegram_long_poll_timeout}
+    assert bodies[1]["offset"] == 42
+    assert submitted == [(7, "dev", "/answer 1")]
+
+
+@pytest.mark.asyncio
+async def test_shutdown_drains_chat_dispatcher(monkeypatch):
+    handled: list[str] = []
+
+    async def handler(chat_id, username, text):
+        await asyncio.sleep(0.01)
+        handled.append(text)
+
+    dispatcher = ChatDispatcher(handler)
+    monkeypatch.setattr("app.main.chat_dispatcher", dispatcher)
+    dispatcher.submit(1, None, "/start code")
+    dispatcher.submit(1, None, "answer")
+    await stop_telegram_poller()
+    assert handled == ["/start code", "answer"]
+
+
+@pytest.mark.asyncio
+async def test_send_bot_message_reuses_shared_client(monkeypatch):
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"ok": True})
+
+    client = AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr("app.telegram._TG_CLIENT", client)
+    assert await send_bot_message(123, "first") is True
+    assert await send_bot_message(123, "second") is True
+    assert len(requests) == 2
+    assert all(request.url.path.endswith("/sendMessage") for request in requests)
+    assert not client.is_closed
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_message_batcher_coalesces_messages_per_chat(patched_bot):
+    batcher = MessageBatcher()
+    deliveries = [
+        batcher.enqueue(1, "first"),
+        batcher.enqueue(2, "other chat"),
+        batcher.enqueue(1, "second"),
+    ]
+    assert await asyncio.gather(*deliveries) == [True, True, True]
+    await batcher.close()
+    assert len(patched_bot.calls) == 2
+    sent = dict(patched_bot.calls)
+    assert sent == {1: "first\nsecond", 2: "other chat"}
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("Yes", "Yes"),
+        ("/answer 2", "No"),
+        ("/ANSWER foo", "foo"),
+        ("/a", None),
+        ("/A x", "x"),
+        ("/ab", "/ab"),
+    ],
+)
+def test_parse_answer_accepts_short_command(text, expected):
+    assert parse_answer(text, ["Yes", "No"]) == expected
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("/start CODE", "CODE"),
+        ("/start\nCODE", "CODE"),
+        ("/start\tCODE", "CODE"),
+        ("/start", None),
+    ],
+)
+def test_extract_start_code_splits_on_any_whitespace(text, expected):
+    assert _extract_start_code(text) == expected